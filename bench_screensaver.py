@@ -0,0 +1,283 @@
+"""
+    Micro-benchmarks for myscreensaver.py
+    Run: python bench_screensaver.py [vec2d|headless|scene|geometry|check]
+                                     [--frames N] [--seed N]
+"""
+import argparse
+import random
+import time
+import timeit
+import tracemalloc
+
+import numpy as np
+import pygame
+
+import geometry
+from myscreensaver import Display, Knot, MovingPoint, NumpyKnotEngine, Vec2d
+from scene import Scene
+
+
+class LegacyVec2d:
+    """
+        Vec2d as it was before __slots__: every temporary has a __dict__
+        and draws two random speeds
+    """
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+        self.speed_x = random.random() * 2
+        self.speed_y = random.random() * 2
+
+    def __add__(self, other_vec):
+        return LegacyVec2d(self.x + other_vec.x, self.y + other_vec.y)
+
+    def __mul__(self, k):
+        return LegacyVec2d(self.x * k, self.y * k)
+
+    def int_pair(self):
+        return int(self.x), int(self.y)
+
+
+def legacy_tuple_knot(points, count):
+    """
+        Tuple knot of screensaver.py as it was before geometry
+    """
+    def add(x, y):
+        return x[0] + y[0], x[1] + y[1]
+
+    def mul(v, k):
+        return v[0] * k, v[1] * k
+
+    def get_point(points, alpha, deg=None):
+        if deg is None:
+            deg = len(points) - 1
+        if deg == 0:
+            return points[0]
+        return add(mul(points[deg], alpha),
+                   mul(get_point(points, alpha, deg - 1), 1 - alpha))
+
+    res = []
+    for i in range(-2, len(points) - 2):
+        ptn = [mul(add(points[i], points[i + 1]), 0.5), points[i + 1],
+               mul(add(points[i + 1], points[i + 2]), 0.5)]
+        res.extend(get_point(ptn, j * (1 / count)) for j in range(count))
+    return res
+
+
+def make_knot(point_type, count=500, steps=35, seed=0):
+    random.seed(seed)
+    knot = Knot(steps)
+    for _ in range(count):
+        knot.add_vec2d(point_type(random.random() * 800,
+                                  random.random() * 600))
+    return knot
+
+
+def measure_frame(func):
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    seconds = min(timeit.repeat(func, number=1, repeat=5))
+    return peak, seconds
+
+
+def bench_vec2d(count=500, steps=35):
+    print(f"get_knot, {count} points, {steps} steps")
+    for name, point_type in (("legacy Vec2d", LegacyVec2d),
+                             ("slotted Vec2d", MovingPoint)):
+        knot = make_knot(point_type, count, steps)
+        peak, seconds = measure_frame(knot.get_knot)
+        print(f"  {name:<16} {peak / 1024:10.1f} KiB/frame "
+              f"{seconds * 1000:8.2f} ms/frame")
+
+
+def bench_geometry(counts=(10, 100, 1000), steps=35):
+    print(f"knot of {steps} steps per segment, ms/frame")
+    print(f"  {'points':>8} {'tuple':>10} {'Vec2d':>10} {'batched':>10}")
+    for count in counts:
+        knot = make_knot(MovingPoint, count, steps)
+        coords = knot.get_coords()
+        array = np.array(coords)
+        paths = (
+            lambda: legacy_tuple_knot(coords, steps),
+            knot.get_knot,
+            lambda: geometry.get_knot(array, steps),
+        )
+        times = [min(timeit.repeat(path, number=1, repeat=5)) * 1000
+                 for path in paths]
+        print(f"  {count:8d} " + " ".join(f"{t:10.3f}" for t in times))
+
+
+def check_knots(count=300, seed=0):
+    """
+        The batched knots and the weighted Knot.get_points must
+        truncate to the same ints as the recursive get_point of
+        legacy_tuple_knot
+    """
+    rnd = random.Random(seed)
+    engine = NumpyKnotEngine()
+    failed = 0
+    for _ in range(count):
+        steps = rnd.randrange(1, 60)
+        # clicks give whole pixels, where a last bit off changes the int
+        points = [(rnd.randrange(800), rnd.randrange(600))
+                  for _ in range(rnd.randrange(3, 40))]
+        expected = [[int(x), int(y)]
+                    for x, y in legacy_tuple_knot(points, steps)]
+        knot = Knot(steps)
+        for x, y in points:
+            knot.add_vec2d(Vec2d(x, y))
+        if (engine.get_knot_pairs(np.array(points), steps) != expected
+                or [list(pair) for pair in knot.get_knot_pairs()] != expected):
+            failed += 1
+    print(f"{count - failed} of {count} knots match the recursive path")
+    return failed == 0
+
+
+class ProfiledKnot(Knot):
+    """
+        Knot which sums up the time spent in its per-frame methods.
+        draw_lines calls get_knot, the time of such nested calls is
+        counted only for the inner method
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.timings = dict.fromkeys(
+            ('get_knot', 'draw_lines', 'set_points'), 0.)
+        self.nested = 0.
+
+    def timed(self, name, method, *args, **kwargs):
+        outer_nested, self.nested = self.nested, 0.
+        begin = time.perf_counter()
+        res = method(*args, **kwargs)
+        spent = time.perf_counter() - begin
+        self.timings[name] += spent - self.nested
+        self.nested = outer_nested + spent
+        return res
+
+    def get_knot_pairs(self, *args, **kwargs):
+        return self.timed('get_knot', super().get_knot_pairs,
+                          *args, **kwargs)
+
+    def draw_lines(self, *args, **kwargs):
+        return self.timed('draw_lines', super().draw_lines, *args, **kwargs)
+
+    def set_points(self, *args, **kwargs):
+        return self.timed('set_points', super().set_points, *args, **kwargs)
+
+
+class ScriptedDisplay(Display):
+    """
+        Headless Display which takes its events from a script
+        instead of the user and stops after a number of frames
+    """
+    knot_type = ProfiledKnot
+
+    def __init__(self, script, frames, **kwargs):
+        super().__init__(headless=True, fps=None, **kwargs)
+        self.script = script
+        self.frames = frames
+        self.frame = 0
+        self.knot = None
+
+    def create_knot(self):
+        self.knot = super().create_knot()
+        return self.knot
+
+    def get_events(self):
+        if self.frame >= self.frames:
+            return [pygame.event.Event(pygame.QUIT)]
+        events = self.script.get(self.frame, [])
+        self.frame += 1
+        return events
+
+
+def make_script(frames, clicks=200, seed=0):
+    """
+        Seeded session: clicks spread over the first half of the run,
+        play from the first frame and a few Num+/Num- presses
+    """
+    rnd = random.Random(seed)
+    script = {0: [pygame.event.Event(pygame.KEYDOWN, key=pygame.K_p)]}
+    for _ in range(clicks):
+        frame = rnd.randrange(max(frames // 2, 1))
+        pos = (rnd.randrange(800), rnd.randrange(600))
+        script.setdefault(frame, []).append(pygame.event.Event(
+            pygame.MOUSEBUTTONDOWN, pos=pos, button=1))
+    for key in (pygame.K_KP_PLUS, pygame.K_KP_PLUS, pygame.K_KP_MINUS):
+        script.setdefault(rnd.randrange(frames), []).append(
+            pygame.event.Event(pygame.KEYDOWN, key=key))
+    return script
+
+
+def bench_headless(frames=300, clicks=200, seed=0, **kwargs):
+    random.seed(seed)
+    screensaver = ScriptedDisplay(make_script(frames, clicks, seed), frames,
+                                  width=800, height=600, name="Screensaver",
+                                  steps=35, **kwargs)
+    begin = time.perf_counter()
+    screensaver.start()
+    seconds = time.perf_counter() - begin
+    print(f"headless {frames} frames, {clicks} clicks: "
+          f"{frames / seconds:.1f} frames/sec")
+    for name, spent in screensaver.knot.timings.items():
+        print(f"  {name:<12} {spent * 1000 / frames:8.3f} ms/frame")
+
+
+def make_scene(curves, points=8, offscreen=0.25, seed=0):
+    """
+        Scene of small compact curves, a part of them out of the screen
+    """
+    rnd = random.Random(seed)
+    random.seed(seed)
+    scene = Scene()
+    for _ in range(curves):
+        left = rnd.randrange(-700, 1500) if rnd.random() < offscreen else (
+            rnd.randrange(800))
+        top, size = rnd.randrange(600), rnd.randrange(20, 200)
+        curve = scene.add_curve(rnd.randrange(5, 36),
+                                color=pygame.Color(rnd.randrange(0xffffff)),
+                                speed=rnd.uniform(0.5, 8), compact=True)
+        for _ in range(points):
+            curve.knot.add_vec2d(MovingPoint(left + rnd.random() * size,
+                                             top + rnd.random() * size))
+    return scene
+
+
+def bench_scene(frames=30, counts=(10, 100, 1000, 5000), seed=0):
+    pygame.init()
+    display = pygame.Surface((800, 600))
+    print(f"scene, {frames} frames")
+    for count in counts:
+        scene = make_scene(count, seed=seed)
+        drawn = 0
+        begin = time.perf_counter()
+        for _ in range(frames):
+            display.fill((0, 0, 0))
+            drawn += scene.draw(display)
+            scene.set_points(display)
+        seconds = (time.perf_counter() - begin) / frames
+        print(f"  {count:6d} curves {drawn / frames:8.1f} drawn "
+              f"{seconds * 1000:9.2f} ms/frame "
+              f"{seconds * 1e6 / count:7.1f} us/curve")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('bench', nargs='?', default='vec2d',
+                        choices=('vec2d', 'headless', 'scene', 'geometry',
+                                 'check'))
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    if args.bench == 'vec2d':
+        bench_vec2d()
+    elif args.bench == 'headless':
+        bench_headless(args.frames, seed=args.seed)
+    elif args.bench == 'scene':
+        bench_scene(seed=args.seed)
+    elif args.bench == 'check':
+        check_knots(seed=args.seed)
+    else:
+        bench_geometry()
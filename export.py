@@ -0,0 +1,179 @@
+"""
+    Renders the screensaver to numbered PNG files or a raw RGB stream
+    using all CPU cores.
+
+    PNG: python export.py frames/ --frames 600 --size 1920x1080
+    Raw: python export.py - --raw --size 3840x2160 | ffmpeg -f rawvideo
+             -pix_fmt rgb24 -s 3840x2160 -r 60 -i - loop.mp4
+
+    The main process moves the points through all frames to find the
+    state at the start of every chunk, workers continue from there with
+    Knot.set_points, so the result does not depend on the worker count.
+"""
+import argparse
+import collections
+import itertools
+import multiprocessing
+import os
+import random
+import sys
+
+import numpy as np
+
+# pygame prints its banner to stdout on import, which would corrupt the
+# raw stream
+os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
+import pygame
+
+import geometry
+from myscreensaver import ColorRamp, Knot, MovingPoint, NumpyKnotEngine
+
+
+class Export:
+    """
+        Settings of an export and the rendering of its chunks
+    """
+    def __init__(self, width, height, frames, points=12, steps=35, seed=0,
+                 hue_step=1, gradient=False, markers=True):
+        self.width = width
+        self.height = height
+        self.frames = frames
+        self.steps = steps
+        self.hue_step = hue_step
+        self.gradient = gradient
+        self.markers = markers
+
+        random.seed(seed)
+        state = []
+        for _ in range(points):
+            point = MovingPoint(random.random() * width,
+                                random.random() * height)
+            state.append((point.x, point.y, point.speed_x, point.speed_y))
+        self.state = np.array(state, dtype=float).reshape(-1, 4)
+
+    def get_chunks(self, chunk_size):
+        """
+            (first frame, frame count, points state) for every chunk
+        """
+        coords = self.state[:, :2].copy()
+        speeds = self.state[:, 2:].copy()
+        chunks = []
+        for first in range(0, self.frames, chunk_size):
+            count = min(chunk_size, self.frames - first)
+            chunks.append((first, count, np.hstack((coords, speeds))))
+            for _ in range(count):
+                geometry.move(coords, speeds, self.width, self.height)
+        return chunks
+
+    def render_chunk(self, chunk):
+        """
+            Yields (frame number, surface) for the frames of the chunk
+        """
+        first, count, state = chunk
+        os.environ['SDL_VIDEODRIVER'] = 'dummy'
+        pygame.init()
+        display = pygame.Surface((self.width, self.height))
+        ramp = ColorRamp()
+        knot = Knot(self.steps, NumpyKnotEngine(), compact=True)
+        for x, y, speed_x, speed_y in state:
+            point = MovingPoint(x, y)
+            point.speed_x, point.speed_y = speed_x, speed_y
+            knot.add_vec2d(point)
+
+        for frame in range(first, first + count):
+            hue = (frame + 1) * self.hue_step
+            colors = None
+            if self.gradient:
+                colors = ramp.get_gradient(hue, len(state))
+            display.fill((0, 0, 0))
+            if self.markers:
+                knot.draw_points(display)
+            knot.draw_lines(display, color=ramp[hue], colors=colors)
+            knot.set_points(display)
+            yield frame, display
+
+
+class PngWriter:
+    def __init__(self, export, path):
+        self.export = export
+        self.path = path
+
+    def __call__(self, chunk):
+        for frame, display in self.export.render_chunk(chunk):
+            pygame.image.save(display, os.path.join(
+                self.path, f"frame_{frame:06d}.png"))
+        return b''
+
+
+class RawWriter:
+    def __init__(self, export):
+        self.export = export
+
+    def __call__(self, chunk):
+        return b''.join(pygame.image.tostring(display, 'RGB')
+                        for _, display in self.export.render_chunk(chunk))
+
+
+def run(export, path, raw=False, workers=None, chunk_size=16,
+        max_bytes=512 * 2 ** 20):
+    """
+        Renders the export with a pool of workers. Raw frames come back
+        to this process and are written to path ('-' is stdout) in order,
+        chunks are made small enough to keep the raw frames in flight
+        within max_bytes
+    """
+    workers = workers or os.cpu_count()
+    stream = None
+    if raw:
+        writer = RawWriter(export)
+        stream = sys.stdout.buffer if path == '-' else open(path, 'wb')
+        frame_bytes = export.width * export.height * 3
+        chunk_size = max(1, min(chunk_size,
+                                max_bytes // (2 * workers * frame_bytes)))
+    else:
+        os.makedirs(path, exist_ok=True)
+        writer = PngWriter(export, path)
+
+    chunks = iter(export.get_chunks(chunk_size))
+    # SDL turns SIGTERM into a quit event, so the workers are let to
+    # finish with close() and join() instead of Pool.terminate()
+    pool = multiprocessing.Pool(workers)
+    try:
+        # at most 2 chunks per worker are in flight, so a slow reader
+        # of the stream does not pile up rendered chunks in memory
+        pending = collections.deque()
+        for chunk in itertools.islice(chunks, 2 * workers):
+            pending.append(pool.apply_async(writer, (chunk,)))
+        while pending:
+            data = pending.popleft().get()
+            for chunk in itertools.islice(chunks, 1):
+                pending.append(pool.apply_async(writer, (chunk,)))
+            if stream is not None:
+                stream.write(data)
+    finally:
+        pool.close()
+        pool.join()
+        if stream is not None and stream is not sys.stdout.buffer:
+            stream.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('path')
+    parser.add_argument('--frames', type=int, default=600)
+    parser.add_argument('--size', default='800x600')
+    parser.add_argument('--points', type=int, default=12)
+    parser.add_argument('--steps', type=int, default=35)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--chunk', type=int, default=16)
+    parser.add_argument('--memory', type=int, default=512,
+                        help="MiB of raw frames in flight")
+    parser.add_argument('--gradient', action='store_true')
+    parser.add_argument('--raw', action='store_true')
+    args = parser.parse_args()
+    width, height = map(int, args.size.split('x'))
+    run(Export(width, height, args.frames, args.points, args.steps,
+               args.seed, gradient=args.gradient),
+        args.path, args.raw, args.workers, args.chunk,
+        args.memory * 2 ** 20)
@@ -2,7 +2,8 @@ import Service
 
 
 class GameEngine:
-    objects = []
+    # objects by their tile, (x, y): object
+    objects = {}
     map = None
     hero = None
     level = -1
@@ -12,6 +13,10 @@ class GameEngine:
     game_process = True
     show_help = False
 
+    def __init__(self):
+        # panels of the chain connected to this engine
+        self.screens = set()
+
     def subscribe(self, obj):
         self.subscribers.add(obj)
 
@@ -22,42 +27,57 @@ class GameEngine:
     def notify(self, message):
         for i in self.subscribers:
             i.update(message)
+        self.mark_dirty("message")
+
+    # SCREENS
+    def add_screen(self, screen):
+        self.screens.add(screen)
+
+    def mark_dirty(self, topic=None):
+        # screens which show the topic are drawn again, all for None
+        for screen in self.screens:
+            if topic is None or topic in screen.topics:
+                screen.dirty = True
 
     # HERO
     def add_hero(self, hero):
         self.hero = hero
 
     def interact(self):
-        for obj in self.objects:
-            if list(obj.position) == self.hero.position:
-                self.delete_object(obj)
-                obj.interact(self, self.hero)
+        obj = self.objects.get(tuple(self.hero.position))
+        if obj is not None:
+            self.delete_object(obj)
+            obj.interact(self, self.hero)
 
     # MOVEMENT
     def move_up(self):
         self.score -= 0.02
-        if self.map[self.hero.position[1] - 1][self.hero.position[0]] == Service.wall:
+        self.mark_dirty("move")
+        if self.map[self.hero.position[1] - 1, self.hero.position[0]] == Service.WALL:
             return
         self.hero.position[1] -= 1
         self.interact()
 
     def move_down(self):
         self.score -= 0.02
-        if self.map[self.hero.position[1] + 1][self.hero.position[0]] == Service.wall:
+        self.mark_dirty("move")
+        if self.map[self.hero.position[1] + 1, self.hero.position[0]] == Service.WALL:
             return
         self.hero.position[1] += 1
         self.interact()
 
     def move_left(self):
         self.score -= 0.02
-        if self.map[self.hero.position[1]][self.hero.position[0] - 1] == Service.wall:
+        self.mark_dirty("move")
+        if self.map[self.hero.position[1], self.hero.position[0] - 1] == Service.WALL:
             return
         self.hero.position[0] -= 1
         self.interact()
 
     def move_right(self):
         self.score -= 0.02
-        if self.map[self.hero.position[1]][self.hero.position[0] + 1] == Service.wall:
+        self.mark_dirty("move")
+        if self.map[self.hero.position[1], self.hero.position[0] + 1] == Service.WALL:
             return
         self.hero.position[0] += 1
         self.interact()
@@ -65,13 +85,15 @@ class GameEngine:
     # MAP
     def load_map(self, game_map):
         self.map = game_map
+        self.mark_dirty()
 
     # OBJECTS
     def add_object(self, obj):
-        self.objects.append(obj)
+        self.objects[tuple(obj.position)] = obj
 
     def add_objects(self, objects):
-        self.objects.extend(objects)
+        for obj in objects:
+            self.add_object(obj)
 
     def delete_object(self, obj):
-        self.objects.remove(obj)
+        del self.objects[tuple(obj.position)]
@@ -59,13 +59,22 @@ create_game(size, True)
 
 while engine.working:
 
+    # only the panels which changed are drawn and updated
+    rects = drawer.draw(gameDisplay)
+    if rects:
+        pygame.display.update(rects)
+
     if KEYBOARD_CONTROL:
-        for event in pygame.event.get():
+        # nothing changes until the next event, so wait for it
+        for event in [pygame.event.wait()] + pygame.event.get():
             if event.type == pygame.QUIT:
                 engine.working = False
+            if event.type == pygame.VIDEOEXPOSE:
+                pygame.display.update()
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_h:
                     engine.show_help = not engine.show_help
+                    engine.mark_dirty("help")
                 if event.key == pygame.K_KP_PLUS:
                     size = size + 1
                     create_game(size, False)
@@ -112,11 +121,6 @@ while engine.working:
         else:
             create_game(size, True)
 
-    gameDisplay.blit(drawer, (0, 0))
-    drawer.draw(gameDisplay)
-
-    pygame.display.update()
-
 pygame.display.quit()
 pygame.quit()
 exit(0)
@@ -1,5 +1,12 @@
 import pygame
 import collections
+import functools
+import math
+
+import numpy as np
+
+import Objects
+import Service
 
 
 class ScreenEngine:
@@ -12,6 +19,21 @@ class ScreenEngine:
         "wooden": (153, 92, 0, 255),
     }
 
+    # fonts by (name, size), SysFont looks the font up on every call
+    fonts = {}
+
+    @staticmethod
+    def get_font(name, size):
+        if (name, size) not in ScreenEngine.fonts:
+            ScreenEngine.fonts[(name, size)] = pygame.font.SysFont(name, size)
+        return ScreenEngine.fonts[(name, size)]
+
+    @staticmethod
+    @functools.lru_cache(maxsize=256)
+    def render_text(font, text, color):
+        # font is (name, size), the surface is shared, only blit it
+        return ScreenEngine.get_font(*font).render(text, True, color)
+
     def __enter__(self):
         return self
 
@@ -19,6 +41,13 @@ class ScreenEngine:
         pass
 
     class ScreenHandle(pygame.Surface):
+        # engine changes after which the panel is drawn again,
+        # see GameEngine.mark_dirty
+        topics = ()
+        # panels under a translucent one are blitted again with it
+        translucent = False
+        # a clean panel which draws nothing is not blitted again
+        visible = True
 
         def __init__(self, *args, **kwargs):
             if len(args) > 1:
@@ -30,28 +59,104 @@ class ScreenEngine:
                 self.next_coord = (0, 0)
             super().__init__(*args, **kwargs)
             self.fill(ScreenEngine.colors["wooden"])
+            self.dirty = True
 
-        def draw(self, canvas):
+        def redraw(self):
+            # draws the panel on itself, panels override it
+            pass
+
+        def get_chain(self, coord=(0, 0)):
+            yield self, coord
             if self.successor is not None:
-                canvas.blit(self.successor, self.next_coord)
-                self.successor.draw(canvas)
+                yield from self.successor.get_chain(self.next_coord)
+
+        def draw(self, canvas):
+            # redraws the dirty panels of the chain and blits them to
+            # canvas with the panels over them, returns the changed rects
+            chain = [(handle, pygame.Rect(coord, handle.get_size()))
+                     for handle, coord in self.get_chain()]
+            rects = [rect for handle, rect in chain if handle.dirty]
+            if not rects:
+                return []
+            full = any(handle.translucent and rect.collidelist(rects) != -1
+                       for handle, rect in chain)
+
+            blitted = []
+            for handle, rect in chain:
+                if handle.dirty:
+                    handle.redraw()
+                    handle.dirty = False
+                elif not handle.visible or (
+                        not full and rect.collidelist(blitted) == -1):
+                    continue
+                canvas.blit(handle, rect)
+                blitted.append(rect)
+            return blitted
 
         # FIXME connect_engine
         def connect_engine(self, engine):
+            engine.add_screen(self)
+            self.dirty = True
             if self.successor is not None:
                 self.successor.connect_engine(engine)
 
     class GameSurface(ScreenHandle):
+        topics = ("move",)
         scale = 1
+        # map is drawn by pre-composited squares of chunk_tiles tiles,
+        # None draws it tile by tile
+        chunk_tiles = 8
 
         def connect_engine(self, engine):
             # FIXME save engine and send it to next in chain
             self.game_engine = engine
+            # create_game connects the engine again on every zoom
+            self._sprites = {}
             return super().connect_engine(engine)
 
+        def get_sprite(self, sprite):
+            # sprite scaled to the tile size of this surface
+            size = int(self.game_engine.sprite_size * self.scale)
+            key = (sprite, size)
+            if key not in self._sprites:
+                self._sprites[key] = pygame.transform.scale(sprite,
+                                                            (size, size))
+            return self._sprites[key]
+
         def draw_hero(self):
             self.game_engine.hero.draw(self)
 
+        def get_view(self, min_x, min_y):
+            # tiles of the map visible on this surface: (width, height)
+            step = self.scale * self.game_engine.sprite_size
+            map_height, map_width = self.game_engine.map.shape
+            return (min(map_width - min_x,
+                        math.ceil(self.get_width() / step)),
+                    min(map_height - min_y,
+                        math.ceil(self.get_height() / step)))
+
+        def get_chunk(self, chunk_x, chunk_y):
+            game_map = self.game_engine.map
+            size = self.game_engine.sprite_size
+            if (game_map is not getattr(self, "_chunks_map", None)
+                    or size != self._chunks_size):
+                self._chunks = {}
+                self._chunks_map = game_map
+                self._chunks_size = size
+
+            if (chunk_x, chunk_y) not in self._chunks:
+                left = chunk_x * self.chunk_tiles
+                top = chunk_y * self.chunk_tiles
+                width = min(self.chunk_tiles, game_map.shape[1] - left)
+                height = min(self.chunk_tiles, game_map.shape[0] - top)
+                chunk = pygame.Surface((width * size, height * size))
+                for i in range(width):
+                    for j in range(height):
+                        chunk.blit(Service.tiles[game_map[top + j, left + i]][0],
+                                   (i * size, j * size))
+                self._chunks[(chunk_x, chunk_y)] = chunk
+            return self._chunks[(chunk_x, chunk_y)]
+
         def draw_map(self):
 
             # FIXME || calculate (min_x,min_y) - left top corner
@@ -61,14 +166,30 @@ class ScreenEngine:
 
         ##
 
-            if self.game_engine.map:
-                for i in range(len(self.game_engine.map[0]) - min_x):
-                    for j in range(len(self.game_engine.map) - min_y):
-                        self.blit(self.game_engine.map[min_y + j][min_x + i][0],
-                                  (self.scale * i * self.game_engine.sprite_size,
-                                   self.scale*j * self.game_engine.sprite_size))
-            else:
+            if self.game_engine.map is None:
                 self.fill(ScreenEngine.colors["white"])
+                return
+
+            size = self.game_engine.sprite_size
+            width, height = self.get_view(min_x, min_y)
+            if self.chunk_tiles is None:
+                for i in range(width):
+                    for j in range(height):
+                        self.blit(Service.tiles[self.game_engine.map[min_y + j, min_x + i]][0],
+                                  (self.scale * i * size,
+                                   self.scale * j * size))
+                return
+
+            # chunks are drawn whole, so tiles out of the view are
+            # clipped, the same as left of min_x
+            tiles = self.chunk_tiles
+            for chunk_x in range(min_x // tiles,
+                                 (min_x + width - 1) // tiles + 1):
+                for chunk_y in range(min_y // tiles,
+                                     (min_y + height - 1) // tiles + 1):
+                    self.blit(self.get_chunk(chunk_x, chunk_y),
+                              ((chunk_x * tiles - min_x) * size * self.scale,
+                               (chunk_y * tiles - min_y) * size * self.scale))
 
         def draw_object(self, sprite, coord):
             size = self.game_engine.sprite_size
@@ -78,14 +199,12 @@ class ScreenEngine:
             min_y = self.game_engine.hero.position[1] - 1
 
         ##
-            self.blit(pygame.transform.scale(
-                sprite,
-                (int(size*self.scale), int(size*self.scale))),
+            self.blit(self.get_sprite(sprite),
                 ((coord[0] - min_x) * size * self.scale,
                 (coord[1] - min_y) * size * self.scale)
             )
 
-        def draw(self, canvas):
+        def redraw(self):
             size = self.game_engine.sprite_size
         # FIXME || calculate (min_x,min_y) - left top corner
 
@@ -95,38 +214,96 @@ class ScreenEngine:
         ##
             self.draw_map()
 
-            for obj in self.game_engine.objects:
+            for obj in self.game_engine.objects.values():
                 self.blit(
-                    pygame.transform.scale(
-                        obj.sprite[0],
-                        (int(size*self.scale), int(size*self.scale))
-                    ),
+                    self.get_sprite(obj.sprite[0]),
                     ((obj.position[0] - min_x) * size * self.scale,
                     (obj.position[1] - min_y) * size * self.scale)
                 )
 
             self.draw_hero()
 
-        # draw next surface in chain
-            return super().draw(canvas)
-
 
     class MiniGameSurface(GameSurface):
-        scale = 0.2
+        # whole map, one block of pixels in the average color of its
+        # sprite for every tile, baked once for every new map, with
+        # objects and the hero drawn over it as blocks of one color
+
+        def connect_engine(self, engine):
+            self._colors = {}
+            return super().connect_engine(engine)
+
+        def get_color(self, sprite):
+            if sprite not in self._colors:
+                self._colors[sprite] = pygame.transform.average_color(sprite)
+            return self._colors[sprite]
+
+        def bake_map(self):
+            game_map = self.game_engine.map
+            height, width = game_map.shape
+            self.block = max(1, min(self.get_width() // width,
+                                    self.get_height() // height))
+            self.map_offset = ((self.get_width() - width * self.block) // 2,
+                               (self.get_height() - height * self.block) // 2)
+            colors = np.array([self.get_color(tile[0])[:3]
+                               for tile in Service.tiles], dtype=np.uint8)
+            pixels = colors[game_map.T]
+            pixels = pixels.repeat(self.block, 0).repeat(self.block, 1)
+            self.map_surface = pygame.surfarray.make_surface(pixels)
+            self.baked_map = game_map
+
+        def draw_marker(self, color, position):
+            self.fill(color, (self.map_offset[0] + position[0] * self.block,
+                              self.map_offset[1] + position[1] * self.block,
+                              self.block, self.block))
+
+        def redraw(self):
+            if self.game_engine.map is None:
+                self.fill(ScreenEngine.colors["white"])
+            else:
+                if self.game_engine.map is not getattr(
+                        self, "baked_map", None):
+                    self.bake_map()
+                self.fill(ScreenEngine.colors["wooden"])
+                self.blit(self.map_surface, self.map_offset)
+                for obj in self.game_engine.objects.values():
+                    color = "red" if isinstance(obj, Objects.Enemy) else "blue"
+                    self.draw_marker(ScreenEngine.colors[color], obj.position)
+                self.draw_marker(ScreenEngine.colors["white"],
+                                 self.game_engine.hero.position)
 
 
     class ProgressBar(ScreenHandle):
+        topics = ("move", "message")
+        font = ("comicsansms", 20)
+        labels = (
+            ("HP", (10, 30)), ("Exp", (10, 70)),
+            ("Level", (300, 30)), ("Gold", (300, 70)),
+            ("Str", (420, 30)), ("Luck", (420, 70)),
+            ("SCORE", (550, 30)),
+        )
 
         def __init__(self, *args, **kwargs):
             super().__init__(*args, **kwargs)
             self.fill(ScreenEngine.colors["wooden"])
+            # last text and surface of every value field by its position
+            self.values = {}
 
         def connect_engine(self, engine):
             # FIXME save engine and send it to next in chain
             self.engine = engine
             return super().connect_engine(engine)
 
-        def draw(self, canvas):
+        def draw_value(self, text, coord):
+            # values change often, so they are rendered here when they
+            # change and do not push the labels out of the text cache
+            if self.values.get(coord, (None,))[0] != text:
+                self.values[coord] = (text, ScreenEngine.get_font(
+                    *self.font).render(text, True,
+                                       ScreenEngine.colors["black"]))
+            self.blit(self.values[coord][1], coord)
+
+        def redraw(self):
             self.fill(ScreenEngine.colors["wooden"])
             pygame.draw.rect(self, ScreenEngine.colors["black"], (50, 30, 200, 30), 2)
             pygame.draw.rect(self, ScreenEngine.colors["black"], (50, 70, 200, 30), 2)
@@ -136,52 +313,22 @@ class ScreenEngine:
             pygame.draw.rect(self, ScreenEngine.colors["green"], (50, 70,
                                                      200 * self.engine.hero.exp / (100 * (2**(self.engine.hero.level - 1))), 30))
 
-            font = pygame.font.SysFont("comicsansms", 20)
-            self.blit(font.render(f'Hero at {self.engine.hero.position}', True, ScreenEngine.colors["black"]),
-                      (250, 0))
-
-            self.blit(font.render(f'{self.engine.level} floor', True, ScreenEngine.colors["black"]),
-                      (10, 0))
-
-            self.blit(font.render(f'HP', True, ScreenEngine.colors["black"]),
-                      (10, 30))
-            self.blit(font.render(f'Exp', True, ScreenEngine.colors["black"]),
-                      (10, 70))
-
-            self.blit(font.render(f'{self.engine.hero.hp}/{self.engine.hero.max_hp}', True, ScreenEngine.colors["black"]),
-                      (60, 30))
-            self.blit(font.render(f'{self.engine.hero.exp}/{(100*(2**(self.engine.hero.level-1)))}', True, ScreenEngine.colors["black"]),
-                      (60, 70))
-
-            self.blit(font.render(f'Level', True, ScreenEngine.colors["black"]),
-                      (300, 30))
-            self.blit(font.render(f'Gold', True, ScreenEngine.colors["black"]),
-                      (300, 70))
+            for text, coord in self.labels:
+                self.blit(ScreenEngine.render_text(
+                    self.font, text, ScreenEngine.colors["black"]), coord)
 
-            self.blit(font.render(f'{self.engine.hero.level}', True, ScreenEngine.colors["black"]),
-                      (360, 30))
-            self.blit(font.render(f'{self.engine.hero.gold}', True, ScreenEngine.colors["black"]),
-                      (360, 70))
-
-            self.blit(font.render(f'Str', True, ScreenEngine.colors["black"]),
-                      (420, 30))
-            self.blit(font.render(f'Luck', True, ScreenEngine.colors["black"]),
-                      (420, 70))
-
-            self.blit(font.render(f'{self.engine.hero.stats["strength"]}', True, ScreenEngine.colors["black"]),
-                      (480, 30))
-            self.blit(font.render(f'{self.engine.hero.stats["luck"]}', True, ScreenEngine.colors["black"]),
-                      (480, 70))
-
-            self.blit(font.render(f'SCORE', True, ScreenEngine.colors["black"]),
-                      (550, 30))
-            self.blit(font.render(f'{self.engine.score:.4f}', True, ScreenEngine.colors["black"]),
-                      (550, 70))
-
-        # draw next surface in chain
-            return super().draw(canvas)
+            self.draw_value(f'Hero at {self.engine.hero.position}', (250, 0))
+            self.draw_value(f'{self.engine.level} floor', (10, 0))
+            self.draw_value(f'{self.engine.hero.hp}/{self.engine.hero.max_hp}', (60, 30))
+            self.draw_value(f'{self.engine.hero.exp}/{(100*(2**(self.engine.hero.level-1)))}', (60, 70))
+            self.draw_value(f'{self.engine.hero.level}', (360, 30))
+            self.draw_value(f'{self.engine.hero.gold}', (360, 70))
+            self.draw_value(f'{self.engine.hero.stats["strength"]}', (480, 30))
+            self.draw_value(f'{self.engine.hero.stats["luck"]}', (480, 70))
+            self.draw_value(f'{self.engine.score:.4f}', (550, 70))
 
     class InfoWindow(ScreenHandle):
+        topics = ("message",)
 
         def __init__(self, *args, **kwargs):
             super().__init__(*args, **kwargs)
@@ -192,20 +339,16 @@ class ScreenEngine:
         def update(self, value):
             self.data.appendleft(f"> {str(value)}")
 
-        def draw(self, canvas):
+        def redraw(self):
             self.fill(ScreenEngine.colors["wooden"])
             size = self.get_size()
 
-            font = pygame.font.SysFont("comicsansms", 25)
             for i, text in enumerate(self.data):
                 text_color = 'blue' if i == 0 else 'black'
-                self.blit(font.render(text, True, ScreenEngine.colors[text_color]),
+                self.blit(ScreenEngine.render_text(
+                    ("comicsansms", 25), text, ScreenEngine.colors[text_color]),
                           (5, 20 + 18 * i))
 
-        # FIXME
-        # draw next surface in chain
-            return super().draw(canvas)
-
         def connect_engine(self, engine):
             # FIXME set this class as Observer to engine and send it to next in
             # chain
@@ -214,6 +357,17 @@ class ScreenEngine:
 
 
     class HelpWindow(ScreenHandle):
+        topics = ("help",)
+
+        @property
+        def translucent(self):
+            # hidden help is blitted fully transparent, but the shade of
+            # the help which was just hidden has to be blitted over
+            return self.dirty or self.engine.show_help
+
+        @property
+        def visible(self):
+            return self.engine.show_help
 
         def __init__(self, *args, **kwargs):
             super().__init__(*args, **kwargs)
@@ -235,22 +389,19 @@ class ScreenEngine:
             self.engine = engine
             return super().connect_engine(engine)
 
-        def draw(self, canvas):
+        def redraw(self):
             alpha = 0
             if self.engine.show_help:
                 alpha = 128
             self.fill((0, 0, 0, alpha))
             size = self.get_size()
-            font1 = pygame.font.SysFont("courier", 24)
-            font2 = pygame.font.SysFont("serif", 24)
             if self.engine.show_help:
                 pygame.draw.lines(self, (255, 0, 0, 255), True, [
                                   (0, 0), (700, 0), (700, 500), (0, 500)], 5)
                 for i, text in enumerate(self.data):
-                    self.blit(font1.render(text[0], True, ((128, 128, 255))),
+                    self.blit(ScreenEngine.render_text(
+                        ("courier", 24), text[0], (128, 128, 255)),
                               (50, 50 + 30 * i))
-                    self.blit(font2.render(text[1], True, ((128, 128, 255))),
+                    self.blit(ScreenEngine.render_text(
+                        ("serif", 24), text[1], (128, 128, 255)),
                               (150, 50 + 30 * i))
-        # FIXME
-        # draw next surface in chain
-            return super().draw(canvas)
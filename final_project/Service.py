@@ -4,6 +4,8 @@ import yaml
 import os
 from abc import ABC
 
+import numpy as np
+
 import Objects
 
 
@@ -25,7 +27,7 @@ def reload_game(engine, hero):
     level_list_max = len(level_list) - 1
     engine.level += 1
     hero.position = [1, 1]
-    engine.objects = []
+    engine.objects = {}
     generator = level_list[min(engine.level, level_list_max)]
     _map = generator['map'].get_map()
     engine.load_map(_map)
@@ -94,6 +96,65 @@ def add_gold(engine, hero):
         engine.notify(f"{gold} gold added")
 
 
+# enemies are placed in the left top part of the map,
+# (left, top, right, bottom) with both ends included
+ENEMY_REGION = (1, 1, 30, 22)
+
+
+class FreeCells:
+    # free floor cells of a map, found once, objects are placed on
+    # cells sampled without replacement from those left, the start
+    # of the hero is never free
+
+    def __init__(self, _map):
+        ys, xs = np.nonzero(_map != WALL)
+        start = (xs == 1) & (ys == 1)
+        self.xs, self.ys = xs[~start], ys[~start]
+        self.size = len(self.xs)
+
+    def sample(self, count, region=None):
+        # count cells (x, y) of the region, the whole map by default
+        xs, ys = self.xs[:self.size], self.ys[:self.size]
+        if region is None:
+            candidates = range(self.size)
+        else:
+            left, top, right, bottom = region
+            candidates = np.flatnonzero((xs >= left) & (xs <= right) &
+                                        (ys >= top) & (ys <= bottom)).tolist()
+        if count > len(candidates):
+            raise ValueError(f"{count} objects do not fit in "
+                             f"{len(candidates)} free cells of "
+                             f"{region or 'the map'}")
+        chosen = random.sample(candidates, count)
+        cells = [(int(xs[i]), int(ys[i])) for i in chosen]
+        # taken cells are replaced by the last free ones
+        for i in sorted(chosen, reverse=True):
+            self.size -= 1
+            self.xs[i], self.ys[i] = self.xs[self.size], self.ys[self.size]
+        return cells
+
+
+def create_allies(cells, props):
+    # objects of every kind in props, a random count of each
+    allies = []
+    for prop in props.values():
+        count = random.randint(prop['min-count'], prop['max-count'])
+        allies.extend(Objects.Ally(prop['sprite'], prop['action'], coord)
+                      for coord in cells.sample(count))
+    return allies
+
+
+def create_enemies(cells, counts):
+    # counts is {enemy name: count}
+    enemies = []
+    for obj_name, count in counts.items():
+        prop = object_list_prob['enemies'][obj_name]
+        enemies.extend(Objects.Enemy(prop['sprite'], prop, prop['experience'],
+                                     coord, prop.get('action'))
+                       for coord in cells.sample(count, ENEMY_REGION))
+    return enemies
+
+
 class MapFactory(yaml.YAMLObject):
 
     @classmethod
@@ -140,10 +201,8 @@ class EndMap(MapFactory):
                         '0                                     0',
                         '000000000000000000000000000000000000000'
                         ]
-            self.Map = list(map(list, self.Map))
-            for i in self.Map:
-                for j in range(len(i)):
-                    i[j] = wall if i[j] == '0' else floor1
+            self.Map = np.where(np.array(list(map(list, self.Map))) == '0',
+                                WALL, FLOOR1).astype(np.uint8)
          
         def get_map(self):
             return self.Map
@@ -162,15 +221,8 @@ class RandomMap(MapFactory):
 
     class Map:
 
-        def __init__(self):
-            self.Map = [[0 for _ in range(41)] for _ in range(41)]
-            for i in range(41):
-                for j in range(41):
-                    if i == 0 or j == 0 or i == 40 or j == 40:
-                        self.Map[j][i] = wall
-                    else:
-                        self.Map[j][i] = [wall, floor1, floor2, floor3, floor1,
-                                          floor2, floor3, floor1, floor2][random.randint(0, 8)]
+        def __init__(self, width=41, height=41):
+            self.Map = create_random_map(width, height)
 
         def get_map(self):
             return self.Map
@@ -182,69 +234,12 @@ class RandomMap(MapFactory):
             self.objects = []
 
         def get_objects(self, _map):
-
-            for obj_name in object_list_prob['objects']:
-                prop = object_list_prob['objects'][obj_name]
-                for i in range(random.randint(prop['min-count'], prop['max-count'])):
-                    coord = (random.randint(1, 39), random.randint(1, 39))
-                    intersect = True
-                    while intersect:
-                        intersect = False
-                        if _map[coord[1]][coord[0]] == wall:
-                            intersect = True
-                            coord = (random.randint(1, 39),
-                                     random.randint(1, 39))
-                            continue
-                        for obj in self.objects:
-                            if coord == obj.position or coord == (1, 1):
-                                intersect = True
-                                coord = (random.randint(1, 39),
-                                         random.randint(1, 39))
-
-                    self.objects.append(Objects.Ally(
-                        prop['sprite'], prop['action'], coord))
-
-            for obj_name in object_list_prob['ally']:
-                prop = object_list_prob['ally'][obj_name]
-                for i in range(random.randint(prop['min-count'], prop['max-count'])):
-                    coord = (random.randint(1, 39), random.randint(1, 39))
-                    intersect = True
-                    while intersect:
-                        intersect = False
-                        if _map[coord[1]][coord[0]] == wall:
-                            intersect = True
-                            coord = (random.randint(1, 39),
-                                     random.randint(1, 39))
-                            continue
-                        for obj in self.objects:
-                            if coord == obj.position or coord == (1, 1):
-                                intersect = True
-                                coord = (random.randint(1, 39),
-                                         random.randint(1, 39))
-                    self.objects.append(Objects.Ally(
-                        prop['sprite'], prop['action'], coord))
-
-            for obj_name in object_list_prob['enemies']:
-                prop = object_list_prob['enemies'][obj_name]
-                for i in range(random.randint(0, 5)):
-                    coord = (random.randint(1, 30), random.randint(1, 22))
-                    intersect = True
-                    while intersect:
-                        intersect = False
-                        if _map[coord[1]][coord[0]] == wall:
-                            intersect = True
-                            coord = (random.randint(1, 39),
-                                     random.randint(1, 39))
-                            continue
-                        for obj in self.objects:
-                            if coord == obj.position or coord == (1, 1):
-                                intersect = True
-                                coord = (random.randint(1, 39),
-                                         random.randint(1, 39))
-
-                    self.objects.append(Objects.Enemy(
-                        prop['sprite'], prop, prop['experience'], coord, prop.get('action')))
-
+            cells = FreeCells(_map)
+            self.objects = create_allies(cells, object_list_prob['objects'])
+            self.objects += create_allies(cells, object_list_prob['ally'])
+            self.objects += create_enemies(cells, {
+                obj_name: random.randint(0, 5)
+                for obj_name in object_list_prob['enemies']})
             return self.objects
 
 
@@ -259,26 +254,9 @@ class EmptyMap(RandomMap):
             self.objects = []
 
         def get_objects(self, _map):
-            prop = object_list_prob['objects']['stairs']
-            for i in range(random.randint(prop['min-count'], prop['max-count'])):
-                coord = (random.randint(1, 39), random.randint(1, 39))
-                intersect = True
-                while intersect:
-                    intersect = False
-                    if _map[coord[1]][coord[0]] == wall:
-                        intersect = True
-                        coord = (random.randint(1, 39),
-                                 random.randint(1, 39))
-                        continue
-                    for obj in self.objects:
-                        if coord == obj.position or coord == (1, 1):
-                            intersect = True
-                            coord = (random.randint(1, 39),
-                                     random.randint(1, 39))
-
-                self.objects.append(Objects.Ally(
-                    prop['sprite'], prop['action'], coord))
-
+            cells = FreeCells(_map)
+            self.objects = create_allies(
+                cells, {'stairs': object_list_prob['objects']['stairs']})
             return self.objects
 
 
@@ -291,69 +269,10 @@ class SpecialMap(RandomMap):
             self.objects = []
 
         def get_objects(self, _map):
-
-            for obj_name in object_list_prob['objects']:
-                prop = object_list_prob['objects'][obj_name]
-                for i in range(random.randint(prop['min-count'], prop['max-count'])):
-                    coord = (random.randint(1, 39), random.randint(1, 39))
-                    intersect = True
-                    while intersect:
-                        intersect = False
-                        if _map[coord[1]][coord[0]] == wall:
-                            intersect = True
-                            coord = (random.randint(1, 39),
-                                     random.randint(1, 39))
-                            continue
-                        for obj in self.objects:
-                            if coord == obj.position or coord == (1, 1):
-                                intersect = True
-                                coord = (random.randint(1, 39),
-                                         random.randint(1, 39))
-
-                    self.objects.append(Objects.Ally(
-                        prop['sprite'], prop['action'], coord))
-
-            for obj_name in object_list_prob['ally']:
-                prop = object_list_prob['ally'][obj_name]
-                for i in range(random.randint(prop['min-count'], prop['max-count'])):
-                    coord = (random.randint(1, 39), random.randint(1, 39))
-                    intersect = True
-                    while intersect:
-                        intersect = False
-                        if _map[coord[1]][coord[0]] == wall:
-                            intersect = True
-                            coord = (random.randint(1, 39),
-                                     random.randint(1, 39))
-                            continue
-                        for obj in self.objects:
-                            if coord == obj.position or coord == (1, 1):
-                                intersect = True
-                                coord = (random.randint(1, 39),
-                                         random.randint(1, 39))
-                    self.objects.append(Objects.Ally(
-                        prop['sprite'], prop['action'], coord))
-
-            for obj_name in self.config:
-                prop = object_list_prob['enemies'][obj_name]
-                for _ in range(self.config[obj_name]):
-                    coord = (random.randint(1, 30), random.randint(1, 22))
-                    intersect = True
-                    while intersect:
-                        intersect = False
-                        if _map[coord[1]][coord[0]] == wall:
-                            intersect = True
-                            coord = (random.randint(1, 39),
-                                     random.randint(1, 39))
-                            continue
-                        for obj in self.objects:
-                            if coord == obj.position or coord == (1, 1):
-                                intersect = True
-                                coord = (random.randint(1, 39),
-                                         random.randint(1, 39))
-
-                    self.objects.append(Objects.Enemy(
-                        prop['sprite'], prop, prop['experience'], coord, prop.get('action')))
-
+            cells = FreeCells(_map)
+            self.objects = create_allies(cells, object_list_prob['objects'])
+            self.objects += create_allies(cells, object_list_prob['ally'])
+            self.objects += create_enemies(cells, self.config)
             return self.objects
 
 
@@ -362,6 +281,26 @@ floor1 = [0]
 floor2 = [0]
 floor3 = [0]
 
+# maps are uint8 arrays of tile ids, map[y, x], tiles[id] is the
+# sprite holder of the tile
+WALL, FLOOR1, FLOOR2, FLOOR3 = range(4)
+tiles = [wall, floor1, floor2, floor3]
+
+# tiles of a random map cell, each one is drawn with probability 1/9
+RANDOM_TILES = np.array([WALL, FLOOR1, FLOOR2, FLOOR3, FLOOR1,
+                         FLOOR2, FLOOR3, FLOOR1, FLOOR2], dtype=np.uint8)
+
+
+def create_random_map(width, height):
+    # one numpy draw for the whole map, seeded from random so that
+    # random.seed still fixes the game
+    rng = np.random.default_rng(random.getrandbits(64))
+    game_map = RANDOM_TILES[rng.integers(0, len(RANDOM_TILES),
+                                         (height, width), dtype=np.uint8)]
+    game_map[[0, -1], :] = WALL
+    game_map[:, [0, -1]] = WALL
+    return game_map
+
 
 def service_init(sprite_size, full=True):
     global object_list_prob, level_list
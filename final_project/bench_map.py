@@ -0,0 +1,66 @@
+"""
+    Benchmark of the random map generation
+    Run: python bench_map.py [--sizes 41 256 1024 4096] [--legacy-max 1024]
+"""
+import argparse
+import random
+import timeit
+
+import numpy as np
+
+import Service
+
+
+def legacy_random_map(width, height):
+    """
+        RandomMap.Map as it was before create_random_map: nested lists
+        of sprite holders, a randint and a list literal for every cell
+    """
+    wall, floor1, floor2, floor3 = (Service.wall, Service.floor1,
+                                    Service.floor2, Service.floor3)
+    game_map = [[0 for _ in range(width)] for _ in range(height)]
+    for i in range(width):
+        for j in range(height):
+            if i == 0 or j == 0 or i == width - 1 or j == height - 1:
+                game_map[j][i] = wall
+            else:
+                game_map[j][i] = [wall, floor1, floor2, floor3, floor1,
+                                  floor2, floor3, floor1, floor2][random.randint(0, 8)]
+    return game_map
+
+
+def check_distribution(size=1024):
+    """
+        Share of every tile inside the border, 1/9 for the wall and
+        3/9, 3/9, 2/9 for the floors
+    """
+    inner = Service.create_random_map(size, size)[1:-1, 1:-1]
+    counts = np.bincount(inner.ravel(), minlength=4) / inner.size
+    print("tile shares " + " ".join(f"{share:.4f}" for share in counts))
+
+
+def bench_maps(sizes, legacy_max):
+    print(f"  {'size':>6} {'legacy ms':>12} {'batched ms':>12} {'MiB':>8}")
+    for size in sizes:
+        legacy = "-"
+        if size <= legacy_max:
+            legacy = min(timeit.repeat(lambda: legacy_random_map(size, size),
+                                       number=1, repeat=3)) * 1000
+            legacy = f"{legacy:.2f}"
+        batched = min(timeit.repeat(
+            lambda: Service.create_random_map(size, size),
+            number=1, repeat=5)) * 1000
+        print(f"  {size:6d} {legacy:>12} {batched:12.2f} "
+              f"{size * size / 2 ** 20:8.2f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[41, 128, 256, 512, 1024, 2048, 4096])
+    parser.add_argument('--legacy-max', type=int, default=1024)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    random.seed(args.seed)
+    bench_maps(args.sizes, args.legacy_max)
+    check_distribution()
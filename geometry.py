@@ -0,0 +1,182 @@
+"""
+    Vector math shared by screensaver.py and myscreensaver.py.
+    Every function takes a point (x, y) or an array of points of shape
+    (n, 2) and works on the whole array at once.
+"""
+import numpy as np
+
+
+def add(a, b):
+    return np.add(a, b)
+
+
+def sub(a, b):
+    return np.subtract(a, b)
+
+
+def scale(a, k):
+    """
+        Multiplies points by a number or by one number per point
+    """
+    return np.multiply(a, np.asarray(k)[..., None])
+
+
+def dot(a, b):
+    return np.einsum('...i,...i->...', a, b)
+
+
+def length(a):
+    a = np.asarray(a)
+    return np.hypot(a[..., 0], a[..., 1])
+
+
+def lerp(a, b, t):
+    """
+        Points between a (t = 0) and b (t = 1)
+    """
+    return add(a, scale(sub(b, a), t))
+
+
+# alpha = i / count of every point of a segment with 1 - alpha, and
+# the alphas as an array, cached by count. Tables of one count stay
+# valid for every curve, so they are never flushed
+_weights = {}
+_alphas = {}
+
+
+def get_weights(count):
+    """
+        (alpha, 1 - alpha) for alpha = i / count
+    """
+    if count not in _weights:
+        alpha = 1 / count
+        _weights[count] = [(i * alpha, 1 - i * alpha) for i in range(count)]
+    return _weights[count]
+
+
+def get_alphas(count):
+    if count not in _alphas:
+        _alphas[count] = np.arange(count) * (1 / count)
+    return _alphas[count]
+
+
+def blend(base_points, alpha):
+    """
+        Points of the curve given by base_points (..., deg + 1, 2) for
+        every alpha. The operations are those of the recursive get_point,
+        p[k] * a + point * (1 - a), so the floats are the same
+    """
+    alpha = np.asarray(alpha)[..., None]
+    point = base_points[..., 0, :]
+    point = np.broadcast_to(point, np.broadcast_shapes(point.shape,
+                                                       alpha.shape))
+    for k in range(1, base_points.shape[-2]):
+        point = base_points[..., k, :] * alpha + point * (1 - alpha)
+    return point
+
+
+def get_points(base_points, count):
+    """
+        count points of the curve given by base_points
+    """
+    base_points = np.asarray(base_points, dtype=float)
+    return blend(base_points, get_alphas(count))
+
+
+def get_segments(points):
+    """
+        Base points of every knot segment, shape (n, 3, 2): middle of
+        the previous edge, the point and middle of the next edge
+    """
+    points = np.asarray(points, dtype=float)
+    prev_points = np.roll(points, 2, axis=0)
+    base_points = np.roll(points, 1, axis=0)
+    return np.stack((
+        (prev_points + base_points) * 0.5,
+        base_points,
+        (base_points + points) * 0.5,
+    ), axis=1)
+
+
+def get_segments_many(points, sizes):
+    """
+        get_segments of several closed polylines stored one after
+        another in points, sizes[i] points in the i-th one
+    """
+    points = np.asarray(points, dtype=float)
+    sizes = np.asarray(sizes)
+    starts = np.repeat(np.cumsum(sizes) - sizes, sizes)
+    lengths = np.repeat(sizes, sizes)
+    local = np.arange(len(points)) - starts
+    prev_points = points[starts + (local - 2) % lengths]
+    base_points = points[starts + (local - 1) % lengths]
+    return np.stack((
+        (prev_points + base_points) * 0.5,
+        base_points,
+        (base_points + points) * 0.5,
+    ), axis=1)
+
+
+def get_knot(points, count):
+    """
+        Closed smooth curve through the middles of the polyline edges,
+        count points per segment
+    """
+    if len(points) < 3:
+        return np.empty((0, 2))
+    return evaluate(get_segments(points), count)[0]
+
+
+def get_counts(segments, max_count, tolerance):
+    """
+        Points per segment for which the knot polyline stays within
+        tolerance pixels of the curve. The curve deviates from its chords
+        by at most |P1 - P0| / (4 * count**2), so the count is the least
+        one meeting the tolerance, but not more than max_count
+    """
+    bend = length(segments[:, 1] - segments[:, 0])
+    counts = np.ceil(np.sqrt(bend / (4 * tolerance)))
+    return np.clip(counts, 1, max_count).astype(int)
+
+
+def get_knot_adaptive(points, max_count, tolerance):
+    """
+        get_knot with the number of points of every segment chosen
+        by get_counts
+    """
+    if len(points) < 3:
+        return np.empty((0, 2))
+    return evaluate(get_segments(points), max_count, tolerance)[0]
+
+
+def evaluate(segments, count, tolerance=None):
+    """
+        Points of the given knot segments one after another and the
+        number of points of each segment
+    """
+    if not tolerance:
+        knot = blend(segments[:, None], get_alphas(count)).reshape(-1, 2)
+        return knot, np.full(len(segments), count)
+    counts = get_counts(segments, count, tolerance)
+    return evaluate_counts(segments, counts), counts
+
+
+def evaluate_counts(segments, counts):
+    """
+        Points of the given knot segments one after another,
+        counts[i] points of the i-th segment
+    """
+    index = np.repeat(np.arange(len(segments)), counts)
+    starts = np.repeat(np.cumsum(counts) - counts, counts)
+    alpha = (np.arange(len(index)) - starts) * (1 / counts)[index]
+    return blend(segments[index], alpha)
+
+
+def move(points, speeds, width, height, dt=1):
+    """
+        Moves points in place and reflects the speeds of the points
+        which left the (0, 0, width, height) box
+    """
+    points += speeds * dt
+    out = (points < 0) | (points > (width, height))
+    np.negative(speeds, out=speeds, where=out)
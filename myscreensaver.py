@@ -1,25 +1,30 @@
+import itertools
+import math
+import os
 import random
 
+import numpy as np
 import pygame
 
+import geometry
+
+# Speeds are given in pixels per frame at this frame rate
+BASE_FPS = 60
+# Longest frame in BASE_FPS frames the physics may catch up on at once
+MAX_DT = 4
+# Num+ makes the adaptive knot tolerance this many times finer
+TOLERANCE_STEP = 0.8
+
 
 class Vec2d:
     """
         Points on screen and operations we able to do with them
     """
+    __slots__ = ('x', 'y')
+
     def __init__(self, x, y):
         self.x = x
         self.y = y
-        self.speed_x = self.generate_speed()
-        self.speed_y = self.generate_speed()
-
-    @staticmethod
-    def generate_speed():
-        return random.random() * 2
-
-    def speedup_point(self):
-        self.x += self.speed_x
-        self.y += self.speed_y
 
     def int_pair(self):
         return int(self.x), int(self.y)
@@ -29,6 +34,11 @@ class Vec2d:
         new_y = self.y + other_vec.y
         return Vec2d(new_x, new_y)
 
+    def __iadd__(self, other_vec):
+        self.x += other_vec.x
+        self.y += other_vec.y
+        return self
+
     def __sub__(self, other_vec):
         new_x = other_vec.x - self.x
         new_y = other_vec.y - self.y
@@ -40,47 +50,246 @@ class Vec2d:
         elif isinstance(k, Vec2d):
             return self.x * k.x + self.y * k.y
 
+    def __imul__(self, k):
+        self.x *= k
+        self.y *= k
+        return self
+
     def __len__(self):
         return int((self.x * self.x + self.y * self.y) ** 0.5)
 
 
+class MovingPoint(Vec2d):
+    """
+        Control point of a polyline which moves with its own speed
+    """
+    __slots__ = ('speed_x', 'speed_y')
+
+    def __init__(self, x, y):
+        super().__init__(x, y)
+        self.speed_x = self.generate_speed()
+        self.speed_y = self.generate_speed()
+
+    @staticmethod
+    def generate_speed():
+        return random.random() * 2
+
+    def speedup_point(self, dt=1):
+        self.x += self.speed_x * dt
+        self.y += self.speed_y * dt
+
+
+class ColorRamp:
+    """
+        Colors of the hue cycle computed once: hue i of size
+        is the color of i * 360 / size degrees
+    """
+    def __init__(self, size=360, saturation=100, lightness=50):
+        self.colors = []
+        for i in range(size):
+            color = pygame.Color(0)
+            color.hsla = (i * 360 / size, saturation, lightness, 100)
+            self.colors.append(color)
+
+    def __getitem__(self, hue):
+        return self.colors[int(hue) % len(self.colors)]
+
+    def get_gradient(self, hue, count, span=360):
+        """
+            count colors from hue going span degrees along the ramp
+        """
+        if not count:
+            return []
+        step = span * len(self.colors) / (360 * count)
+        return [self[hue + i * step] for i in range(count)]
+
+
+class PointBuffer:
+    """
+        Parallel x, y, speed_x and speed_y arrays which grow in place
+    """
+    def __init__(self, capacity=64):
+        self._data = np.empty((4, capacity))
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def append(self, x, y, speed_x, speed_y):
+        if self._size == self._data.shape[1]:
+            data = np.empty((4, 2 * self._size))
+            data[:, :self._size] = self._data[:, :self._size]
+            self._data = data
+        self._data[:, self._size] = (x, y, speed_x, speed_y)
+        self._size += 1
+
+    def get_coords(self):
+        return self._data[:2, :self._size].T
+
+    def move(self, width, height, dt=1):
+        geometry.move(self._data[:2, :self._size].T,
+                      self._data[2:, :self._size].T, width, height, dt)
+
+    def clear(self):
+        self._size = 0
+
+
 class Polyline:
     """
-        Defines a set of a polyline points and methods to add/del and draw them
+        Defines a set of a polyline points and methods to add/del and draw them.
+        In compact mode points are kept in a PointBuffer instead of Vec2d list
     """
-    def __init__(self, steps):
+    _markers = {}
+
+    def __init__(self, steps, compact=False):
         self.steps = steps
+        self.compact = compact
         self._points = []
+        self._buffer = PointBuffer() if compact else None
 
     def add_vec2d(self, vec):
-        self._points.append(vec)
-
-    def set_points(self, display):
+        if self.compact:
+            self._buffer.append(vec.x, vec.y, vec.speed_x, vec.speed_y)
+        else:
+            self._points.append(vec)
+
+    def get_vectors(self):
+        if self.compact:
+            return [Vec2d(x, y) for x, y in self._buffer.get_coords()]
+        return self._points
+
+    def get_coords(self):
+        if self.compact:
+            return self._buffer.get_coords()
+        return [(point.x, point.y) for point in self._points]
+
+    def get_bounds(self):
+        """
+            Bounding box of the points, which also holds the knot
+        """
+        coords = self.get_coords()
+        if len(coords) == 0:
+            return None
+        if self.compact:
+            left, top = coords.min(axis=0)
+            right, bottom = coords.max(axis=0)
+        else:
+            xs, ys = zip(*coords)
+            left, top, right, bottom = min(xs), min(ys), max(xs), max(ys)
+        return pygame.Rect(int(left), int(top),
+                           int(right) - int(left) + 1,
+                           int(bottom) - int(top) + 1)
+
+    def set_points(self, display, dt=1):
+        if self.compact:
+            self._buffer.move(display.get_width(), display.get_height(), dt)
+            return
         for p in range(len(self._points)):
-            self._points[p].speedup_point()
+            self._points[p].speedup_point(dt)
             if self._points[p].x > display.get_width() or self._points[p].x < 0:
                 self._points[p].speed_x = - self._points[p].speed_x
             if self._points[p].y > display.get_height() or (
                     self._points[p].y < 0):
                 self._points[p].speed_y = - self._points[p].speed_y
 
+    @staticmethod
+    def get_marker(color, width):
+        """
+            Point marker pre-rendered once for every (color, width)
+        """
+        key = (tuple(color), width)
+        if key not in Polyline._markers:
+            marker = pygame.Surface((2*width + 1, 2*width + 1),
+                                    pygame.SRCALPHA)
+            pygame.draw.circle(marker, color, (width, width), width)
+            Polyline._markers[key] = marker
+        return Polyline._markers[key]
+
     def draw_points(self, display, color=(255, 255, 255), width=3):
-        for point in self._points:
-            pygame.draw.circle(
-                display,
-                color,
-                point.int_pair(),
-                width,
-            )
+        if self.compact:
+            points = self._buffer.get_coords().astype(int).tolist()
+        else:
+            points = [point.int_pair() for point in self._points]
+        if not points:
+            return None
+        marker = self.get_marker(color, width)
+        rects = display.blits(
+            [(marker, (x - width, y - width)) for x, y in points])
+        return rects[0].unionall(rects[1:])
 
     def flush_points(self):
         self._points = []
+        if self.compact:
+            self._buffer.clear()
+
+
+class NumpyKnotEngine:
+    """
+        Batched knot smoothing over a contiguous array of points.
+        Gives the same coordinates as Knot.get_knot
+    """
+    def get_knot(self, points, steps, tolerance=None):
+        if tolerance:
+            return geometry.get_knot_adaptive(points, steps, tolerance)
+        return geometry.get_knot(points, steps)
+
+    def get_knot_pairs(self, points, steps, tolerance=None):
+        return self.get_knot(points, steps, tolerance).astype(int).tolist()
+
+    def get_segments_pairs(self, points, indices, steps, tolerance=None):
+        """
+            Integer points of the segments starting at indices - 2 and
+            the number of points of each segment
+        """
+        segments = geometry.get_segments(points)[indices]
+        knot, counts = geometry.evaluate(segments, steps, tolerance)
+        return knot.astype(int).tolist(), counts.tolist()
 
 
 class Knot(Polyline):
     """
-        Set of methods which help to draw lines by set of knots
+        Set of methods which help to draw lines by set of knots.
+        With a tolerance (in pixels) every segment gets only as many of
+        steps points as it needs to look smooth
     """
+    get_weights = staticmethod(geometry.get_weights)
+
+    def __init__(self, steps, engine=None, compact=False, tolerance=None):
+        super().__init__(steps, compact)
+        self.engine = engine
+        self.tolerance = tolerance
+        self.__flush_knot()
+
+    def __flush_knot(self):
+        """
+            Segments are cached by the indices of their three points,
+            so a new point leaves all but the closing segments valid
+        """
+        self.__segments = {}
+        self.__unsplit = None
+        self.__knot = None
+        self.__knot_key = None
+
+    def add_vec2d(self, vec):
+        super().add_vec2d(vec)
+        self.__knot = None
+
+    def set_points(self, display, dt=1):
+        super().set_points(display, dt)
+        self.__flush_knot()
+
+    def flush_points(self):
+        super().flush_points()
+        self.__flush_knot()
+
+    def set_steps(self, steps):
+        self.steps = steps
+        self.__flush_knot()
+
+    def set_tolerance(self, tolerance):
+        self.tolerance = tolerance
+        self.__flush_knot()
+
     @staticmethod
     def get_point(points, alpha, deg=None):
         if deg is None:
@@ -90,49 +299,161 @@ class Knot(Polyline):
         return points[deg] * alpha + (
                 Knot.get_point(points, alpha, deg-1) * (1-alpha))
 
-    @staticmethod
-    def get_points(base_points, count):
-        alpha = 1 / count
+    @classmethod
+    def get_points(cls, base_points, count):
+        """
+            get_point for every alpha, the same operations in the same
+            order, without the recursion
+        """
         res = []
-        for i in range(count):
-            res.append(Knot.get_point(base_points, i*alpha))
+        for alpha, beta in cls.get_weights(count):
+            point = base_points[0]
+            for k in range(1, len(base_points)):
+                point = base_points[k] * alpha + point * beta
+            res.append(point)
         return res
 
-    def get_knot(self):
-        if len(self._points) < 3:
+    def get_segment(self, points, i, steps):
+        ptn = [points[i] + points[i+1], points[i+1],
+               points[i+1] + points[i+2]]
+        ptn[0] *= 0.5
+        ptn[2] *= 0.5
+        count = steps
+        if self.tolerance:
+            bend = math.hypot(ptn[1].x - ptn[0].x, ptn[1].y - ptn[0].y)
+            count = min(steps, max(1, math.ceil(
+                math.sqrt(bend / (4 * self.tolerance)))))
+        return self.get_points(ptn, count)
+
+    def get_knot(self, steps=None):
+        steps = steps or self.steps
+        points = self.get_vectors()
+        if len(points) < 3:
             return []
         res = []
-        for i in range(-2, len(self._points) - 2):
-            ptn = []
-            ptn.append((self._points[i] + self._points[i+1])*0.5)
-            ptn.append(self._points[i+1])
-            ptn.append((self._points[i+1] + self._points[i+2])*0.5)
-            res.extend(self.get_points(ptn, self.steps))
+        for i in range(-2, len(points) - 2):
+            res.extend(self.get_segment(points, i, steps))
         return res
 
-    def draw_lines(self, display, color=(255, 255, 255), width=3):
-        knots = self.get_knot()
-        for knot_index in range(-1, len(knots) - 1):
-            pygame.draw.line(
-                display,
-                color,
-                knots[knot_index].int_pair(),
-                knots[knot_index + 1].int_pair(),
-                width,
-            )
+    def __get_segments_pairs(self, indices, steps):
+        if self.engine is not None:
+            return self.engine.get_segments_pairs(
+                self.get_coords(), indices, steps, self.tolerance)
+        points = self.get_vectors()
+        pairs, counts = [], []
+        for index in indices:
+            segment = self.get_segment(points, index - 2, steps)
+            pairs.extend(knot.int_pair() for knot in segment)
+            counts.append(len(segment))
+        return pairs, counts
+
+    def get_knot_pairs(self, steps=None):
+        """
+            Integer knot points. Only segments whose points changed since
+            the last call are computed again
+        """
+        steps = steps or self.steps
+        if self.__knot_key != (steps, self.tolerance):
+            self.__flush_knot()
+            self.__knot_key = (steps, self.tolerance)
+        if self.__knot is not None:
+            return self.__knot
+        count = len(self.get_coords())
+        if count < 3:
+            self.__knot = []
+            return self.__knot
+
+        keys = [(i % count, (i + 1) % count, (i + 2) % count)
+                for i in range(-2, count - 2)]
+        if self.__unsplit is not None:
+            self.__split_segments(*self.__unsplit)
+        missing = [j for j, key in enumerate(keys)
+                   if key not in self.__segments]
+        pairs, counts = self.__get_segments_pairs(missing, steps)
+
+        if len(missing) == count:
+            # moving points change every segment, split them only if
+            # they are reused
+            self.__unsplit = (keys, pairs, counts)
+            self.__knot = pairs
+            return self.__knot
+
+        self.__split_segments([keys[j] for j in missing], pairs, counts)
+        self.__segments = {key: self.__segments[key] for key in keys}
+        self.__knot = list(itertools.chain.from_iterable(
+            self.__segments.values()))
+        return self.__knot
+
+    def __split_segments(self, keys, pairs, counts):
+        start = 0
+        for key, count in zip(keys, counts):
+            self.__segments[key] = pairs[start:start + count]
+            start += count
+        self.__unsplit = None
+
+    def draw_lines(self, display, color=(255, 255, 255), width=3,
+                   antialias=False, steps=None, colors=None):
+        """
+            Draws the knot with one color or, if colors are given, with
+            the colors spread evenly along the knot
+        """
+        knots = self.get_knot_pairs(steps)
+        if len(knots) < 2:
+            return None
+        if colors:
+            return self.draw_gradient(display, knots, colors, width,
+                                      antialias)
+        if antialias:
+            return pygame.draw.aalines(display, color, True, knots)
+        return pygame.draw.lines(display, color, True, knots, width)
+
+    @staticmethod
+    def draw_gradient(display, knots, colors, width=3, antialias=False):
+        rects = []
+        count = min(len(colors), len(knots))
+        for i in range(count):
+            part = knots[i * len(knots) // count:
+                         (i + 1) * len(knots) // count + 1]
+            if i == count - 1:
+                part = part + knots[:1]
+            if antialias:
+                rects.append(pygame.draw.aalines(
+                    display, colors[i], False, part))
+            else:
+                rects.append(pygame.draw.lines(
+                    display, colors[i], False, part, width))
+        return rects[0].unionall(rects[1:])
 
 
 class Display:
     """
         Defines pygame display settings and methods
     """
-    def __init__(self, width, height, name, steps):
+    knot_type = Knot
+
+    def __init__(self, width, height, name, steps, compact=False,
+                 antialias=False, headless=False, fps=BASE_FPS,
+                 incremental=False, hue_step=1, tolerance=None,
+                 gradient=False):
         self.width = width
         self.height = height
         self.name = name
         self.steps = steps
+        self.tolerance = tolerance
+        self.fps = fps
+        self.compact = compact
+        self.antialias = antialias
+        self.headless = headless
+        self.incremental = incremental
+        self.hue_step = hue_step
+        self.gradient = gradient
         self.pause = True
         self.show_help = False
+        self.__rects = []
+        self.__changed = True
+        self.__full_redraw = True
+        self.__help = None
+        self.__help_key = None
 
         self.__events = {
             'key_pressed': pygame.KEYDOWN,
@@ -149,19 +470,46 @@ class Display:
         }
 
     def __init_window(self):
+        if self.headless:
+            os.environ['SDL_VIDEODRIVER'] = 'dummy'
         pygame.init()
-        self.display = pygame.display.set_mode((self.width, self.height))
-        pygame.display.set_caption(self.name)
-        self.color = pygame.Color(0)
+        if self.headless:
+            self.display = pygame.Surface((self.width, self.height))
+        else:
+            self.display = pygame.display.set_mode((self.width, self.height))
+            pygame.display.set_caption(self.name)
+        self.ramp = ColorRamp()
+        self.color = self.ramp[0]
         self.hue = 0
 
     def __set_color(self):
-        self.display.fill((0, 0, 0))
-        self.hue = (self.hue + 1) % 360
-        self.color.hsla = (self.hue, 100, 50, 100)
-
-    def draw_help(self):
-        self.display.fill((50, 50, 50))
+        self.hue = (self.hue + self.hue_step) % 360
+        self.color = self.ramp[self.hue]
+
+    def __clear(self):
+        if self.incremental and not self.__full_redraw:
+            for rect in self.__rects:
+                self.display.fill((0, 0, 0), rect)
+        else:
+            self.display.fill((0, 0, 0))
+
+    def __update(self, rects):
+        """
+            Flips the whole frame or, in incremental mode, updates only
+            the areas drawn in this and the previous frame
+        """
+        if not self.headless:
+            if self.incremental and not self.__full_redraw and (
+                    not self.show_help):
+                pygame.display.update(self.__rects + rects)
+            else:
+                pygame.display.flip()
+        self.__rects = rects
+        self.__full_redraw = self.show_help
+
+    def __render_help(self):
+        help_surface = pygame.Surface((self.width, self.height))
+        help_surface.fill((50, 50, 50))
         font1 = pygame.font.SysFont("courier", 24)
         font2 = pygame.font.SysFont("serif", 24)
         data = []
@@ -171,55 +519,115 @@ class Display:
         data.append(["Num+", "More points"])
         data.append(["Num-", "Less points"])
         data.append(["", ""])
+        if self.tolerance:
+            data.append([f"{self.tolerance:.2f}", "Tolerance, px"])
         data.append([str(self.steps), "Current points"])
 
-        pygame.draw.lines(self.display, (255, 50, 50, 255), True, [
+        pygame.draw.lines(help_surface, (255, 50, 50, 255), True, [
             (0, 0), (800, 0), (800, 600), (0, 600)], 5)
         for i, text in enumerate(data):
-            self.display.blit(font1.render(
+            help_surface.blit(font1.render(
                 text[0], True, (128, 128, 255)), (100, 100 + 30 * i))
-            self.display.blit(font2.render(
+            help_surface.blit(font2.render(
                 text[1], True, (128, 128, 255)), (200, 100 + 30 * i))
+        return help_surface
+
+    def draw_help(self):
+        if self.__help_key != (self.steps, self.tolerance):
+            self.__help = self.__render_help()
+            self.__help_key = (self.steps, self.tolerance)
+        self.display.blit(self.__help, (0, 0))
+
+    def create_knot(self):
+        return self.knot_type(
+            steps=self.steps,
+            engine=NumpyKnotEngine(),
+            compact=self.compact,
+            tolerance=self.tolerance,
+        )
+
+    def get_events(self):
+        return pygame.event.get()
+
+    def handle_event(self, event, knot):
+        """
+            Applies one event to the knot. Returns False to stop the loop
+        """
+        self.__changed = True
+        if event.type == self.__events['quit']:
+            return False
+
+        if event.type == self.__events['key_pressed']:
+            if event.key == self.__bindings['escape']:
+                return False
+            if event.key == self.__bindings['pause']:
+                self.pause = not self.pause
+            if event.key == self.__bindings['reload']:
+                knot.flush_points()
+            if event.key == self.__bindings['increase_steps']:
+                if self.tolerance:
+                    self.tolerance *= TOLERANCE_STEP
+                    knot.set_tolerance(self.tolerance)
+                else:
+                    self.steps += 1
+                    knot.set_steps(self.steps)
+            if event.key == self.__bindings['decrease_steps']:
+                if self.tolerance:
+                    self.tolerance /= TOLERANCE_STEP
+                    knot.set_tolerance(self.tolerance)
+                else:
+                    self.steps -= 1 if self.steps > 1 else 0
+                    knot.set_steps(self.steps)
+            if event.key == self.__bindings['help']:
+                self.show_help = not self.show_help
+
+        if event.type == self.__bindings['set_point']:
+            knot.add_vec2d(MovingPoint(*event.pos))
+        return True
+
+    def draw_frame(self, knot, dt=1):
+        if self.incremental and self.pause and not self.hue_step and (
+                not self.__changed):
+            return
+        self.__changed = False
+
+        self.__clear()
+        self.__set_color()
+        colors = None
+        if self.gradient:
+            colors = self.ramp.get_gradient(self.hue, len(knot.get_coords()))
+        rects = [
+            knot.draw_points(self.display),
+            knot.draw_lines(self.display, color=self.color,
+                            antialias=self.antialias, colors=colors),
+        ]
+
+        if not self.pause:
+            knot.set_points(self.display, dt)
+
+        if self.show_help:
+            self.draw_help()
+
+        self.__update([rect for rect in rects if rect is not None])
+
+    def get_dt(self, clock):
+        """
+            Sleeps up to the target fps and returns the frame time
+            in BASE_FPS frames. Without a target every frame is one step
+        """
+        if not self.fps:
+            return 1
+        return min(clock.tick(self.fps) * BASE_FPS / 1000, MAX_DT)
 
     def start(self):
         self.__init_window()
-        knot = Knot(steps=self.steps)
+        knot = self.create_knot()
+        clock = pygame.time.Clock()
         run = True
         while run:
-            for event in pygame.event.get():
-                if event.type == self.__events['quit']:
-                    run = False
-
-                if event.type == self.__events['key_pressed']:
-                    if event.key == self.__bindings['escape']:
-                        run = False
-                    if event.key == self.__bindings['pause']:
-                        self.pause = not self.pause
-                    if event.key == self.__bindings['reload']:
-                        knot.flush_points()
-                    if event.key == self.__bindings['increase_steps']:
-                        self.steps += 1
-                        knot.steps += 1
-                    if event.key == self.__bindings['decrease_steps']:
-                        self.steps -= 1 if self.steps > 1 else 0
-                        knot.steps -= 1 if knot.steps > 1 else 0
-                    if event.key == self.__bindings['help']:
-                        self.show_help = not self.show_help
-
-                if event.type == self.__bindings['set_point']:
-                    knot.add_vec2d(Vec2d(*event.pos))
-
-            self.__set_color()
-            knot.draw_points(self.display)
-            knot.draw_lines(self.display, color=self.color)
-
-            if not self.pause:
-                knot.set_points(self.display)
-
-            if self.show_help:
-                self.draw_help()
-
-            pygame.display.flip()
+            for event in self.get_events():
+                run = self.handle_event(event, knot) and run
+            self.draw_frame(knot, self.get_dt(clock))
 
         self.__stop()
 
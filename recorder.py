@@ -0,0 +1,169 @@
+"""
+    Recording and replay of screensaver sessions.
+
+    Record: python recorder.py record session.ssr [--seed N] [--compact]
+            [--antialias] [--gradient] [--tolerance PX] [--hue-step N]
+    Replay: python recorder.py replay session.ssr [--window] [--save out.png]
+
+    File format (little-endian): header (magic, version, random seed,
+    width, height, steps, option flags, tolerance, hue step), then a
+    stream of records. The display options which change the picture are
+    kept in the header so a replay draws the same frames. Every record starts
+    with a tag byte. Events of a frame come before its frame record,
+    which holds the frame time passed to the physics.
+"""
+import argparse
+import hashlib
+import random
+import struct
+
+import pygame
+
+from myscreensaver import Display
+
+
+MAGIC = b'SSRC'
+VERSION = 2
+HEADER = struct.Struct('<4sBQHHHBdh')
+FRAME = struct.Struct('<d')
+KEY = struct.Struct('<I')
+CLICK = struct.Struct('<hhB')
+TAG_FRAME, TAG_QUIT, TAG_KEY, TAG_CLICK = range(4)
+FLAG_COMPACT, FLAG_ANTIALIAS, FLAG_GRADIENT = 1, 2, 4
+
+
+class RecordingDisplay(Display):
+    """
+        Display which writes its input events and frame times to a file
+    """
+    def __init__(self, path, seed=None, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.seed = random.randrange(2 ** 63) if seed is None else seed
+        self.__file = None
+
+    def start(self):
+        random.seed(self.seed)
+        with open(self.path, 'wb') as self.__file:
+            flags = (FLAG_COMPACT * self.compact
+                     | FLAG_ANTIALIAS * self.antialias
+                     | FLAG_GRADIENT * self.gradient)
+            self.__file.write(HEADER.pack(
+                MAGIC, VERSION, self.seed, self.width, self.height,
+                self.steps, flags, self.tolerance or 0, self.hue_step))
+            super().start()
+
+    def get_events(self):
+        events = super().get_events()
+        for event in events:
+            if event.type == pygame.QUIT:
+                self.__file.write(bytes((TAG_QUIT,)))
+            elif event.type == pygame.KEYDOWN:
+                self.__file.write(bytes((TAG_KEY,)) + KEY.pack(event.key))
+            elif event.type == pygame.MOUSEBUTTONDOWN:
+                self.__file.write(bytes((TAG_CLICK,)) + CLICK.pack(
+                    event.pos[0], event.pos[1], event.button))
+        return events
+
+    def get_dt(self, clock):
+        dt = super().get_dt(clock)
+        self.__file.write(bytes((TAG_FRAME,)) + FRAME.pack(dt))
+        return dt
+
+
+class ReplayDisplay(Display):
+    """
+        Display which plays a recorded session back as fast as it can
+    """
+    def __init__(self, path, headless=True, **kwargs):
+        with open(path, 'rb') as file:
+            self.__data = file.read()
+        (magic, version, self.seed, width, height, steps, flags, tolerance,
+         hue_step) = HEADER.unpack_from(self.__data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a screensaver recording")
+        super().__init__(width, height, "Replay", steps,
+                         compact=bool(flags & FLAG_COMPACT),
+                         antialias=bool(flags & FLAG_ANTIALIAS),
+                         headless=headless, fps=None,
+                         hue_step=hue_step,
+                         tolerance=tolerance or None,
+                         gradient=bool(flags & FLAG_GRADIENT), **kwargs)
+        self.__offset = HEADER.size
+        self.__dt = 1
+        self.frames = 0
+        self.last_frame = None
+
+    def start(self):
+        random.seed(self.seed)
+        super().start()
+
+    def get_events(self):
+        events = []
+        while self.__offset < len(self.__data):
+            tag = self.__data[self.__offset]
+            self.__offset += 1
+            if tag == TAG_FRAME:
+                self.__dt, = FRAME.unpack_from(self.__data, self.__offset)
+                self.__offset += FRAME.size
+                self.frames += 1
+                return events
+            if tag == TAG_QUIT:
+                events.append(pygame.event.Event(pygame.QUIT))
+            elif tag == TAG_KEY:
+                key, = KEY.unpack_from(self.__data, self.__offset)
+                self.__offset += KEY.size
+                events.append(pygame.event.Event(pygame.KEYDOWN, key=key))
+            elif tag == TAG_CLICK:
+                x, y, button = CLICK.unpack_from(self.__data, self.__offset)
+                self.__offset += CLICK.size
+                events.append(pygame.event.Event(
+                    pygame.MOUSEBUTTONDOWN, pos=(x, y), button=button))
+        events.append(pygame.event.Event(pygame.QUIT))
+        return events
+
+    def get_dt(self, clock):
+        return self.__dt
+
+    def draw_frame(self, knot, dt=1):
+        super().draw_frame(knot, dt)
+        if self.__offset >= len(self.__data):
+            # the display is closed when start() returns
+            self.last_frame = pygame.image.tostring(self.display, 'RGB')
+
+    def checksum(self):
+        """
+            Digest of the last frame for golden-image checks
+        """
+        return hashlib.sha1(self.last_frame).hexdigest()
+
+    def save(self, path):
+        pygame.image.save(pygame.image.fromstring(
+            self.last_frame, (self.width, self.height), 'RGB'), path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('mode', choices=('record', 'replay'))
+    parser.add_argument('path')
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--compact', action='store_true')
+    parser.add_argument('--antialias', action='store_true')
+    parser.add_argument('--gradient', action='store_true')
+    parser.add_argument('--tolerance', type=float)
+    parser.add_argument('--hue-step', type=int, default=1)
+    parser.add_argument('--window', action='store_true')
+    parser.add_argument('--save')
+    args = parser.parse_args()
+    if args.mode == 'record':
+        RecordingDisplay(args.path, args.seed, width=800, height=600,
+                         name="Screensaver", steps=35, compact=args.compact,
+                         antialias=args.antialias, gradient=args.gradient,
+                         tolerance=args.tolerance,
+                         hue_step=args.hue_step).start()
+    else:
+        replay = ReplayDisplay(args.path, headless=not args.window)
+        replay.start()
+        if args.save:
+            replay.save(args.save)
+        print(f"{replay.frames} frames, last frame {replay.checksum()}")
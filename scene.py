@@ -0,0 +1,108 @@
+import numpy as np
+import pygame
+
+import geometry
+from myscreensaver import Knot, NumpyKnotEngine
+
+
+class Curve:
+    """
+        Knot of a scene with its own color and speed
+    """
+    def __init__(self, knot, color=(255, 255, 255), speed=1):
+        self.knot = knot
+        self.color = color
+        self.speed = speed
+
+
+class Scene:
+    """
+        Set of independent curves which are moved and drawn together.
+        Curves out of the screen are skipped, small and fast ones are
+        drawn with less steps than their knot has. The knots of all
+        curves are evaluated in one batch instead of curve by curve
+    """
+    def __init__(self, lod_pixels=8, fast_speed=4):
+        self.lod_pixels = lod_pixels
+        self.fast_speed = fast_speed
+        self.curves = []
+        self.engine = NumpyKnotEngine()
+
+    def add_curve(self, steps, color=(255, 255, 255), speed=1,
+                  compact=False):
+        curve = Curve(Knot(steps, self.engine, compact), color, speed)
+        self.curves.append(curve)
+        return curve
+
+    def flush_curves(self):
+        self.curves = []
+
+    def get_steps(self, counts, sizes, speeds, max_steps):
+        """
+            Level of detail of every curve: about one knot point per
+            lod_pixels along every segment, half of it for fast curves.
+            sizes are width + height of the curve bounds
+        """
+        steps = np.ceil(2 * sizes / (counts * self.lod_pixels))
+        steps = np.where(speeds > self.fast_speed, np.ceil(steps / 2), steps)
+        return np.clip(steps, 1, max_steps).astype(int)
+
+    def set_points(self, display, dt=1):
+        for curve in self.curves:
+            curve.knot.set_points(display, dt * curve.speed)
+
+    def draw(self, display, width=3, antialias=False):
+        """
+            Draws visible curves and returns how many of them were drawn.
+            Knots of all visible curves are computed at once
+        """
+        curves, coords = [], []
+        for curve in self.curves:
+            points = curve.knot.get_coords()
+            if len(points) >= 3:
+                curves.append(curve)
+                coords.append(np.asarray(points, dtype=float))
+        if not curves:
+            return 0
+        sizes = np.array([len(points) for points in coords])
+        points = np.concatenate(coords)
+        starts = np.cumsum(sizes) - sizes
+        lows = np.trunc(np.minimum.reduceat(points, starts))
+        highs = np.trunc(np.maximum.reduceat(points, starts))
+        screen = np.array(display.get_size())
+        visible = np.all((highs + width >= 0) & (lows - width < screen),
+                         axis=1)
+        if not visible.any():
+            return 0
+
+        curves = [curve for curve, shown in zip(curves, visible) if shown]
+        keep = np.repeat(visible, sizes)
+        points, sizes = points[keep], sizes[visible]
+        steps = self.get_steps(
+            sizes, (highs - lows + 1)[visible].sum(axis=1),
+            np.array([curve.speed for curve in curves]),
+            np.array([curve.knot.steps for curve in curves]))
+
+        segments = geometry.get_segments_many(points, sizes)
+        counts = np.repeat(steps, sizes)
+        tolerances = np.repeat([curve.knot.tolerance or np.nan
+                                for curve in curves], sizes)
+        adaptive = ~np.isnan(tolerances)
+        if adaptive.any():
+            counts[adaptive] = geometry.get_counts(
+                segments[adaptive], counts[adaptive], tolerances[adaptive])
+        # pygame takes the rows of the int array as points, which is
+        # cheaper than a list of pairs
+        knots = geometry.evaluate_counts(segments, counts).astype(int)
+
+        ends = np.cumsum(np.add.reduceat(counts, np.cumsum(sizes) - sizes))
+        start = 0
+        for curve, end in zip(curves, ends.tolist()):
+            if antialias:
+                pygame.draw.aalines(display, curve.color, True,
+                                    knots[start:end])
+            else:
+                pygame.draw.lines(display, curve.color, True,
+                                  knots[start:end], width)
+            start = end
+        return len(curves)
@@ -1,31 +1,40 @@
 import pygame
 import random
-import math
+import numpy as np
+
+import geometry
 
 SCREEN_DIM = (800, 600)
+FPS = 60
+# Наибольшее время кадра (в кадрах FPS), которое получает физика
+MAX_DT = 4
+# Допуск адаптивного узла (в пикселях) при включении клавишей T
+TOLERANCE = 1.0
+# Num+ уменьшает допуск во столько раз
+TOLERANCE_STEP = 0.8
 
 
-# Методы для работы с векторами
+# Методы для работы с векторами, принимают и массивы векторов (см. geometry)
 
 
 def sub(x, y):  # разность двух векторов
-    return x[0] - y[0], x[1] - y[1]
+    return geometry.sub(x, y)
 
 
 def add(x, y):  # сумма двух векторов
-    return x[0] + y[0], x[1] + y[1]
+    return geometry.add(x, y)
 
 
 def length(x):  # длинна вектора
-    return math.sqrt(x[0] * x[0] + x[1] * x[1])
+    return geometry.length(x)
 
 
 def mul(v, k):  # умножение вектора на число
-    return v[0] * k, v[1] * k
+    return geometry.scale(v, k)
 
 
 def scal_mul(v, k):  # скалярное умножение векторов
-    return v[0] * k, v[1] * k
+    return geometry.dot(v, k)
 
 
 def vec(x, y):  # создание вектора по началу (x) и концу (y) направленного отрезка
@@ -56,31 +65,22 @@ def get_point(points, alpha, deg=None):
     return add(mul(points[deg], alpha), mul(get_point(points, alpha, deg - 1), 1 - alpha))
 
 
+# Веса get_point для каждого alpha кэшируются в geometry по (deg, count)
 def get_points(base_points, count):
-    alpha = 1 / count
-    res = []
-    for i in range(count):
-        res.append(get_point(base_points, i * alpha))
-    return res
-
+    return geometry.get_points(base_points, count)
 
-def get_knot(points, count):
-    if len(points) < 3:
-        return []
-    res = []
-    for i in range(-2, len(points) - 2):
-        ptn = []
-        ptn.append(mul(add(points[i], points[i + 1]), 0.5))
-        ptn.append(points[i + 1])
-        ptn.append(mul(add(points[i + 1], points[i + 2]), 0.5))
 
-        res.extend(get_points(ptn, count))
-    return res
+# Если задан tolerance (в пикселях), count - наибольшее число точек сегмента
+def get_knot(points, count, tolerance=None):
+    if tolerance:
+        return geometry.get_knot_adaptive(points, count, tolerance)
+    return geometry.get_knot(points, count)
 
 
 # Отрисовка справки
-def draw_help():
-    gameDisplay.fill((50, 50, 50))
+def render_help():
+    help_surface = pygame.Surface(SCREEN_DIM)
+    help_surface.fill((50, 50, 50))
     font1 = pygame.font.SysFont("courier", 24)
     font2 = pygame.font.SysFont("serif", 24)
     data = []
@@ -89,26 +89,36 @@ def draw_help():
     data.append(["P", "Pause/Play"])
     data.append(["Num+", "More points"])
     data.append(["Num-", "Less points"])
+    data.append(["T", "Adaptive knot"])
     data.append(["", ""])
+    if tolerance:
+        data.append([f"{tolerance:.2f}", "Tolerance, px"])
     data.append([str(steps), "Current points"])
 
-    pygame.draw.lines(gameDisplay, (255, 50, 50, 255), True, [
+    pygame.draw.lines(help_surface, (255, 50, 50, 255), True, [
                       (0, 0), (800, 0), (800, 600), (0, 600)], 5)
     for i, text in enumerate(data):
-        gameDisplay.blit(font1.render(
+        help_surface.blit(font1.render(
             text[0], True, (128, 128, 255)), (100, 100 + 30 * i))
-        gameDisplay.blit(font2.render(
+        help_surface.blit(font2.render(
             text[1], True, (128, 128, 255)), (200, 100 + 30 * i))
+    return help_surface
+
+
+# Справка рисуется заново только при изменении steps или tolerance
+help_cache = {}
+
+
+def draw_help():
+    if help_cache.get("key") != (steps, tolerance):
+        help_cache["surface"] = render_help()
+        help_cache["key"] = (steps, tolerance)
+    gameDisplay.blit(help_cache["surface"], (0, 0))
 
 
-# Персчитывание координат опорных точек
-def set_points(points, speeds):
-    for p in range(len(points)):
-        points[p] = add(points[p], speeds[p])
-        if points[p][0] > SCREEN_DIM[0] or points[p][0] < 0:
-            speeds[p] = (- speeds[p][0], speeds[p][1])
-        if points[p][1] > SCREEN_DIM[1] or points[p][1] < 0:
-            speeds[p] = (speeds[p][0], -speeds[p][1])
+# Персчитывание координат опорных точек, dt - время кадра в кадрах FPS
+def set_points(points, speeds, dt=1):
+    geometry.move(points, speeds, SCREEN_DIM[0], SCREEN_DIM[1], dt)
 
 
 
@@ -119,16 +129,24 @@ if __name__ == "__main__":
     pygame.display.set_caption("MyScreenSaver")
 
     steps = 35
+    tolerance = None
     working = True
-    points = []
-    speeds = []
+    points = np.empty((0, 2))
+    speeds = np.empty((0, 2))
     show_help = False
     pause = True
 
+    # Цвета для всех 360 значений hue считаются один раз
+    hue_ramp = []
+    for ramp_hue in range(360):
+        color = pygame.Color(0)
+        color.hsla = (ramp_hue, 100, 50, 100)
+        hue_ramp.append(color)
     hue = 0
-    color = pygame.Color(0)
+    clock = pygame.time.Clock()
 
     while working:
+        dt = min(clock.tick(FPS) * FPS / 1000, MAX_DT)
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 working = False
@@ -136,28 +154,37 @@ if __name__ == "__main__":
                 if event.key == pygame.K_ESCAPE:
                     working = False
                 if event.key == pygame.K_r:
-                    points = []
-                    speeds = []
+                    points = np.empty((0, 2))
+                    speeds = np.empty((0, 2))
                 if event.key == pygame.K_p:
                     pause = not pause
+                if event.key == pygame.K_t:
+                    tolerance = None if tolerance else TOLERANCE
                 if event.key == pygame.K_KP_PLUS:
-                    steps += 1
+                    if tolerance:
+                        tolerance *= TOLERANCE_STEP
+                    else:
+                        steps += 1
                 if event.key == pygame.K_F1:
                     show_help = not show_help
                 if event.key == pygame.K_KP_MINUS:
-                    steps -= 1 if steps > 1 else 0
+                    if tolerance:
+                        tolerance /= TOLERANCE_STEP
+                    else:
+                        steps -= 1 if steps > 1 else 0
 
             if event.type == pygame.MOUSEBUTTONDOWN:
-                points.append(event.pos)
-                speeds.append((random.random() * 2, random.random() * 2))
+                points = np.append(points, [event.pos], axis=0)
+                speeds = np.append(
+                    speeds, [(random.random() * 2, random.random() * 2)], axis=0)
 
         gameDisplay.fill((0, 0, 0))
         hue = (hue + 1) % 360
-        color.hsla = (hue, 100, 50, 100)
+        color = hue_ramp[hue]
         draw_points(points)
-        draw_points(get_knot(points, steps), "line", 3, color)
+        draw_points(get_knot(points, steps, tolerance), "line", 3, color)
         if not pause:
-            set_points(points, speeds)
+            set_points(points, speeds, dt)
         if show_help:
             draw_help()
 